@@ -2,7 +2,7 @@ import argparse
 import copy
 import math
 import os
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
 
 import numpy as np
 import torch
@@ -47,9 +47,22 @@ parser.add_argument("--epochs", type=int, default=20)
 parser.add_argument("--batch_size", type=int, default=512)
 parser.add_argument("--channels", type=int, default=128)
 parser.add_argument("--aggr", type=str, default="sum")
+parser.add_argument("--num_layers", type=int, default=2)
 parser.add_argument("--num_neighbors", type=int, default=128)
-parser.add_argument("--num_workers", type=int, default=1)
+# More than 8 loader workers tends to regress due to memory contention:
+parser.add_argument("--num_workers", type=int, default=min(8, os.cpu_count() or 1))
+parser.add_argument("--compile", action="store_true")
+parser.add_argument(
+    "--compile_mode",
+    type=str,
+    default="default",
+    choices=["default", "reduce-overhead", "max-autotune"],
+)
+parser.add_argument("--cache_eval", action="store_true")
+parser.add_argument("--amp", action="store_true")
+parser.add_argument("--bf16", action="store_true")
 args = parser.parse_args()
+args.amp = args.amp or args.bf16  # `--bf16` implies mixed precision.
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 seed_everything(42)
@@ -80,7 +93,7 @@ data: HeteroData = make_pkey_fkey_graph(
 
 sampler = NeighborSampler(  # Initialize sampler only once.
     data,
-    num_neighbors=[args.num_neighbors, args.num_neighbors],
+    num_neighbors=[args.num_neighbors for _ in range(args.num_layers)],
     time_attr="time",
 )
 
@@ -92,26 +105,39 @@ for split, table in [
 ]:
     table_input = get_train_table_input(table=table, task=task)
     entity_table = table_input.nodes[0]
+    # Only the train loader gets the full worker pool and a deep prefetch
+    # queue. The test loader is used once, so its workers do not persist:
+    num_workers = args.num_workers if split == "train" else min(args.num_workers, 1)
+    prefetch_kwargs = (
+        {"prefetch_factor": 4} if split == "train" and num_workers > 0 else {}
+    )
     loader_dict[split] = NodeLoader(
         data,
         node_sampler=sampler,
         input_nodes=table_input.nodes,
         input_time=table_input.time,
         transform=table_input.transform,
+        filter_per_worker=True,
         batch_size=args.batch_size,
         shuffle=split == "train",
-        num_workers=args.num_workers,
-        persistent_workers=args.num_workers > 0,
+        num_workers=num_workers,
+        persistent_workers=split != "test" and num_workers > 0,
+        pin_memory=device.type == "cuda",
+        **prefetch_kwargs,
     )
 
 if task.task_type == TaskType.BINARY_CLASSIFICATION:
     out_channels = 1
     loss_fn = BCEWithLogitsLoss()
+    # Convert logits into probabilities, as required by threshold-based
+    # metrics (`accuracy`, `f1`):
+    postprocess = torch.sigmoid
     tune_metric = "roc_auc"
     higher_is_better = True
 elif task.task_type == TaskType.REGRESSION:
     out_channels = 1
     loss_fn = L1Loss()
+    postprocess = lambda pred: pred
     tune_metric = "mae"
     higher_is_better = False
 
@@ -139,6 +165,7 @@ class Model(torch.nn.Module):
             edge_types=data.edge_types,
             channels=args.channels,
             aggr=args.aggr,
+            num_layers=args.num_layers,
         )
         self.head = MLP(
             args.channels,
@@ -169,67 +196,110 @@ class Model(torch.nn.Module):
             num_sampled_edges_dict,
         )
 
-        return self.head(x_dict[entity_table][: seed_time.size(0)])
+        out = self.head(x_dict[entity_table][: seed_time.size(0)])
+        return out.squeeze(-1) if out_channels == 1 else out
 
 
 model = Model().to(device)
+if args.compile:
+    # Mini-batches sampled by the loader vary in shape, so compile with
+    # dynamic shapes and allow graph breaks:
+    model = torch.compile(model, dynamic=True, mode=args.compile_mode)
 optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
 
+# BF16 has the same exponent range as FP32, so only FP16 needs loss scaling:
+amp_dtype = torch.bfloat16 if args.bf16 else torch.float16
+use_scaler = args.amp and not args.bf16 and device.type == "cuda"
+if hasattr(torch.amp, "GradScaler"):  # PyTorch >= 2.3
+    scaler = torch.amp.GradScaler(device.type, enabled=use_scaler)
+else:
+    scaler = torch.cuda.amp.GradScaler(enabled=use_scaler)
+
 
 def train() -> Dict[str, float]:
     model.train()
 
-    loss_accum = count_accum = 0
+    # Accumulate the loss on device to avoid a host sync per mini-batch:
+    loss_accum = torch.zeros((), device=device)
+    count_accum = 0
     for batch in tqdm(loader_dict["train"]):
-        batch = batch.to(device)
-
-        optimizer.zero_grad()
-        pred = model(
-            batch.tf_dict,
-            batch.edge_index_dict,
-            batch[entity_table].seed_time,
-            batch.time_dict,
-            batch.batch_dict,
-            batch.num_sampled_nodes_dict,
-            batch.num_sampled_edges_dict,
-        )
-        pred = pred.view(-1) if pred.size(1) == 1 else pred
-        loss = loss_fn(pred, batch[entity_table].y)
-        loss.backward()
-        optimizer.step()
-
-        loss_accum += loss.detach().item() * pred.size(0)
+        batch = batch.to(device, non_blocking=True)
+
+        optimizer.zero_grad(set_to_none=True)
+        with torch.autocast(device.type, dtype=amp_dtype, enabled=args.amp):
+            pred = model(
+                batch.tf_dict,
+                batch.edge_index_dict,
+                batch[entity_table].seed_time,
+                batch.time_dict,
+                batch.batch_dict,
+                batch.num_sampled_nodes_dict,
+                batch.num_sampled_edges_dict,
+            )
+            loss = loss_fn(pred, batch[entity_table].y)
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
+
+        loss_accum += loss.detach() * pred.size(0)
         count_accum += pred.size(0)
 
-    return loss_accum / count_accum
+    return loss_accum.item() / count_accum
+
+
+# The validation graph, seed nodes and seed times are fixed across epochs, so
+# its sampled mini-batches can be kept in (pinned) host memory and reused:
+cached_val_batches: Optional[List[HeteroData]] = None
+
+
+def get_val_batches() -> Iterable[HeteroData]:
+    global cached_val_batches
+
+    if not args.cache_eval:
+        return loader_dict["val"]
+    if cached_val_batches is None:
+        cached_val_batches = list(loader_dict["val"])
+    return cached_val_batches
 
 
 @torch.no_grad()
-def test(loader: NodeLoader) -> np.ndarray:
+def test(loader: Iterable[HeteroData]) -> np.ndarray:
     model.eval()
 
     pred_list = []
     for batch in tqdm(loader):
-        batch = batch.to(device)
-        pred = model(
-            batch.tf_dict,
-            batch.edge_index_dict,
-            batch[entity_table].seed_time,
-            batch.time_dict,
-            batch.batch_dict,
-            batch.num_sampled_nodes_dict,
-            batch.num_sampled_edges_dict,
-        )
-        pred = pred.view(-1) if pred.size(1) == 1 else pred
-        pred_list.append(pred.detach().cpu())
-    return torch.cat(pred_list, dim=0).numpy()
-
-
-state_dict = None
+        # `HeteroData.to()` works in-place, so move a shallow copy in order to
+        # keep cached batches in host memory:
+        batch = copy.copy(batch).to(device, non_blocking=True)
+        with torch.autocast(device.type, dtype=amp_dtype, enabled=args.amp):
+            pred = model(
+                batch.tf_dict,
+                batch.edge_index_dict,
+                batch[entity_table].seed_time,
+                batch.time_dict,
+                batch.batch_dict,
+                batch.num_sampled_nodes_dict,
+                batch.num_sampled_edges_dict,
+            )
+        # Keep predictions on device and copy them back once after the loop,
+        # so the next forward pass does not wait on a per-batch host sync:
+        pred_list.append(pred.detach())
+    pred = postprocess(torch.cat(pred_list, dim=0).float())
+    return pred.cpu().numpy()
+
+
+# Keep the best model weights in reusable (pinned) host memory, starting from
+# the initial weights in case no epoch improves on `best_val_metric`:
+best_state_dict = {
+    key: torch.empty_like(value, device="cpu", pin_memory=device.type == "cuda").copy_(
+        value
+    )
+    for key, value in model.state_dict().items()
+}
 best_val_metric = 0 if higher_is_better else math.inf
 for epoch in range(1, args.epochs + 1):
     train_loss = train()
-    val_pred = test(loader_dict["val"])
+    val_pred = test(get_val_batches())
     val_metrics = task.evaluate(val_pred, task.val_table)
     print(f"Epoch: {epoch:02d}, Train loss: {train_loss}, Val metrics: {val_metrics}")
 
@@ -237,10 +307,11 @@ for epoch in range(1, args.epochs + 1):
         not higher_is_better and val_metrics[tune_metric] < best_val_metric
     ):
         best_val_metric = val_metrics[tune_metric]
-        state_dict = copy.deepcopy(model.state_dict())
+        for key, value in model.state_dict().items():
+            best_state_dict[key].copy_(value, non_blocking=True)
 
-model.load_state_dict(state_dict)
-val_pred = test(loader_dict["val"])
+model.load_state_dict(best_state_dict)
+val_pred = test(get_val_batches())
 val_metrics = task.evaluate(val_pred, task.val_table)
 print(f"Best Val metrics: {val_metrics}")
 
@@ -38,7 +38,7 @@ class Task:
         self.entity_col = entity_col
 
         self._full_test_table = None
-        self._cached_table_dict = None
+        self._cached_table_dict: Dict[str, Table] = {}
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(dataset={self.dataset})"
@@ -57,8 +57,8 @@ class Task:
     @property
     def train_table(self) -> Table:
         """Returns the train table for a task."""
-        if self._cached_table_dict is None:
-            table = self.make_table(
+        if "train" not in self._cached_table_dict:
+            self._cached_table_dict["train"] = self.make_table(
                 self.dataset.db,
                 pd.date_range(
                     self.dataset.val_timestamp - self.timedelta,
@@ -66,21 +66,17 @@ class Task:
                     freq=-self.timedelta,
                 ),
             )
-        else:
-            table = self._cached_table_dict["train"]
-        return self.filter_dangling_entities(table)
+        return self.filter_dangling_entities(self._cached_table_dict["train"])
 
     @property
     def val_table(self) -> Table:
         r"""Returns the val table for a task."""
-        if self._cached_table_dict is None:
-            table = self.make_table(
+        if "val" not in self._cached_table_dict:
+            self._cached_table_dict["val"] = self.make_table(
                 self.dataset.db,
                 pd.Series([self.dataset.val_timestamp]),
             )
-        else:
-            table = self._cached_table_dict["val"]
-        return self.filter_dangling_entities(table)
+        return self.filter_dangling_entities(self._cached_table_dict["val"])
 
     def _mask_input_cols(self, table: Table) -> Table:
         input_cols = [
@@ -97,14 +93,14 @@ class Task:
     @property
     def test_table(self) -> Table:
         r"""Returns the test table for a task."""
-        if self._cached_table_dict is None:
-            full_table = self.make_table(
+        if "full_test" not in self._cached_table_dict:
+            self._cached_table_dict["full_test"] = self.make_table(
                 self.dataset._full_db,
                 pd.Series([self.dataset.test_timestamp]),
             )
-        else:
-            full_table = self._cached_table_dict["full_test"]
-        self._full_test_table = self.filter_dangling_entities(full_table)
+        self._full_test_table = self.filter_dangling_entities(
+            self._cached_table_dict["full_test"]
+        )
         return self._mask_input_cols(self._full_test_table)
 
     def filter_dangling_entities(self, table: Table) -> Table:
@@ -25,8 +25,10 @@ class FakeDataset(Dataset):
     ):
         db = self.make_db(num_products, num_customers, num_reviews)
         db.reindex_pkeys_and_fkeys()
-        val_timestamp = db.min_timestamp + 0.8 * (db.max_timestamp - db.min_timestamp)
-        test_timestamp = db.min_timestamp + 0.9 * (db.max_timestamp - db.min_timestamp)
+        # Split in integer nanoseconds to avoid floating point rounding:
+        min_ns, max_ns = db.min_timestamp.value, db.max_timestamp.value
+        val_timestamp = pd.Timestamp(min_ns + (max_ns - min_ns) * 4 // 5)
+        test_timestamp = pd.Timestamp(min_ns + (max_ns - min_ns) * 9 // 10)
         super().__init__(
             db=db,
             val_timestamp=val_timestamp,
@@ -1,3 +1,5 @@
+import pandas as pd
+
 from relbench.datasets import FakeDataset
 
 
@@ -11,6 +13,9 @@ def test_fake_reviews_dataset():
 
     train_table = task.train_table
     val_table = task.val_table
+    # Ensure that tables are only computed once:
+    assert task.train_table is train_table
+    assert task.val_table is val_table
     for table in [train_table, val_table]:
         assert set(table.df.columns) >= {
             "timestamp",
@@ -23,3 +28,22 @@ def test_fake_reviews_dataset():
         "timestamp",
         "customer_id",
     }
+
+
+def test_fake_dataset_split_timestamps():
+    class _FakeDataset(FakeDataset):
+        def make_db(self, *args, **kwargs):
+            db = super().make_db(*args, **kwargs)
+            # Use a time span that is not a multiple of 10 nanoseconds, such
+            # that floating point splitting would round:
+            df = db.table_dict["review"].df
+            df["review_time"] = df["review_time"].astype("datetime64[ns]")
+            df.loc[df.index[-1], "review_time"] += pd.Timedelta(7, unit="ns")
+            return db
+
+    dataset = _FakeDataset()
+    min_ns = dataset.db.table_dict["review"].df["review_time"].min().value
+    max_ns = dataset._full_db.table_dict["review"].df["review_time"].max().value
+    assert max_ns % 10 == 7
+    assert dataset.val_timestamp.value == min_ns + (max_ns - min_ns) * 4 // 5
+    assert dataset.test_timestamp.value == min_ns + (max_ns - min_ns) * 9 // 10